@@ -1,16 +1,45 @@
 import asyncio
-import uuid
-import os
-import json
+import contextlib
 from common.logging_config import config_logging
 import logging
+import random
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine
 from enum import StrEnum
+from json import JSONDecodeError  # orjson.JSONDecodeError subclasses it
 from typing import Optional
 
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:  # stdlib fallback, also takes bytes but is slower
+    import json
+
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+
 config_logging("test_logs.jsonl")
 logger = logging.getLogger(__name__)
 # logger = logging.LoggerAdapter(logger, extra={"session_id":10})
 
+# stream-json puts a whole message on one line, default 64 KiB limit overruns on long ones
+STREAM_LIMIT = 4 * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+STDERR_TAIL_LINES = 64
+MAX_BACKOFF_SECONDS = 30
+DISPLAY_LIMIT = 250
+# stderr stays bytes, so the -c fallback check is a plain bytes search
+NO_HISTORY_MARKER = b"No prior conversation history found"
+
+
+def _truncate(text: str, limit: int = DISPLAY_LIMIT) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
+
 
 class ClaudeProcessError(Exception):
     def __init__(self, message, result_data=None):
@@ -29,7 +58,15 @@ class FilePermissions(StrEnum):
 
 
 class ClaudeCodeRunner:
-    __slots__ = ("_permissions", "_retries", "_runner_instance")
+    __slots__ = (
+        "_permissions",
+        "_retries",
+        "_runner_instance",
+        "_allowed_tools_csv",
+        "_is_full_access",
+        "_cmd_suffix",
+        "_sem",
+    )
 
     _claude_instance = 0
 
@@ -37,14 +74,30 @@ class ClaudeCodeRunner:
         self,
         permissions: FilePermissions = FilePermissions.READ_ONLY,
         retries: int = 5,
+        run_limit: Optional[int] = None,
     ):
-        self._permissions = permissions
+        # normalised to the enum member so the checks below can compare by identity,
+        # an unknown value raises ValueError here instead of running with no tools
+        self._permissions = FilePermissions(permissions)
         self._retries = max(0, retries)
         self._runner_instance = 0
+        # permissions never change after init, so build the --allowedTools value once
+        self._allowed_tools_csv = ",".join(self._get_allowed_tools())
+        self._is_full_access = self._permissions is FilePermissions.FULL_ACCESS
+        # argv tail that only depends on permissions, shared by every run
+        self._cmd_suffix = ("--verbose", "--allowedTools", self._allowed_tools_csv)
+        if self._is_full_access:
+            self._cmd_suffix += ("--dangerously-skip-permissions",)
+        # caps how many prompts this runner has in flight at once, None is unbounded
+        self._sem = (
+            asyncio.BoundedSemaphore(run_limit)
+            if run_limit
+            else contextlib.nullcontext()
+        )
         ClaudeCodeRunner._claude_instance += 1
 
     def _get_allowed_tools(self) -> list[str]:
-        if self._permissions == FilePermissions.READ_ONLY:
+        if self._permissions is FilePermissions.READ_ONLY:
             return [
                 "Read",
                 "LS",
@@ -57,7 +110,7 @@ class ClaudeCodeRunner:
                 "Agent",
             ]
 
-        elif self._permissions == FilePermissions.FULL_ACCESS:
+        else:  # FULL_ACCESS, __init__ only accepts FilePermissions members
             return [
                 "Read",
                 "LS",
@@ -75,107 +128,148 @@ class ClaudeCodeRunner:
                 "WebSearch",
                 "Agent",
             ]
-        else:
-            return []
+
+    @staticmethod
+    async def _iter_lines(
+        stream: asyncio.StreamReader, chunk_size: int = READ_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        # one wakeup per chunk rather than per line, lines are split here without
+        # their newline and a trailing partial line is yielded at EOF
+        pending = bytearray()
+        while chunk := await stream.read(chunk_size):
+            # only the new chunk can hold the last newline, so a long line spanning
+            # many chunks is never rescanned or resplit
+            newline = chunk.rfind(b"\n")
+            pending.extend(chunk)
+            if newline == -1:
+                continue
+            end = len(pending) - len(chunk) + newline
+            with memoryview(pending) as view:
+                complete = bytes(view[:end])
+            del pending[: end + 1]
+            for line in complete.split(b"\n"):
+                yield line
+        if pending:
+            yield bytes(pending)
 
     async def _stream_stdout_handler(
-        self, stream: asyncio.StreamReader, run_session_id: str
+        self, lines: AsyncIterator[bytes], run_session_id: str
     ) -> Optional[dict]:
-        buffer = ""
+        buffer = b""
         log_error = {"run_session_id": run_session_id, "status": "running"}
-        async for line in stream:
-            if not line:
-                continue
-            line = line.decode("utf-8").strip()
-            if not line:
+        # extra is copied onto each LogRecord, so one dict can be updated in place
+        log_running = {
+            "claude_session_id": None,
+            "run_session_id": run_session_id,
+            "status": "running",
+        }
+        claude_session_id = None
+        log_info = logger.isEnabledFor(logging.INFO)
+        # returns at the result message, a long-lived caller passes the same line
+        # iterator again for the next prompt so nothing read past it is lost
+        async for line in lines:
+            # split already dropped the newline and the parser skips surrounding
+            # whitespace, so raw bytes go straight to the parser. isspace stops at
+            # the first non-space byte, so it is O(1) for any JSON line
+            if not line or line.isspace():
                 continue
 
             buffer = buffer + line if buffer else line
             try:
-                data = json.loads(buffer)
-                # success
-                buffer = ""
+                # parsed inline, the parser holds the GIL throughout so an executor
+                # would only add handoff cost without letting the loop run meanwhile
+                data = _json_loads(buffer)
+                # success, keep the raw bytes around for logging
+                raw, buffer = buffer, b""
 
                 msg_type = data.get("type")
-                claude_session_id = data.get("session_id")
-                log_running = {
-                    "claude_session_id": claude_session_id,
-                    "run_session_id": run_session_id,
-                    "status": "running",
-                }
-
-                if msg_type == "system":
-                    cwd = data.get("cwd", "N/A")
-                    logger.info(
-                        f"[SYSTEM] Initialized in directory: {cwd}",
-                        extra=log_running,
-                    )
-
-                elif msg_type == "assistant":
-                    content_list = data.get("message", {}).get("content", [])
-                    for content_item in content_list:
-                        item_type = content_item.get("type")
-                        if item_type == "tool_use":
-                            tool_name = content_item.get("name", "UnknownTool")
-                            tool_input = content_item.get("input", {})
-                            input_str = ", ".join(
-                                [f"{k}='{v}'" for k, v in tool_input.items()]
-                            )
-                            display_input = (
-                                (input_str[:250] + "...")
-                                if len(input_str) > 250
-                                else input_str
-                            )
-                            logger.info(
-                                f"[ASSISTANT] Tool Use: {tool_name}({display_input})",
-                                extra=log_running,
-                            )
-                        elif item_type == "text":
-                            text = content_item.get("text", "").strip()
-                            if text:
-                                display_text = (
-                                    (text[:250] + "...") if len(text) > 250 else text
+                if msg_type == "user":
+                    # tool results echoed back to the model, nothing to log
+                    continue
+
+                session_id = data.get("session_id")
+                if session_id != claude_session_id:
+                    claude_session_id = log_running["claude_session_id"] = session_id
+
+                match msg_type:
+                    case "system":
+                        cwd = data.get("cwd", "N/A")
+                        logger.info(
+                            "[SYSTEM] Initialized in directory: %s",
+                            cwd,
+                            extra=log_running,
+                        )
+
+                    # content is only formatted for display, skip it all when INFO is off
+                    case "assistant" if log_info:
+                        message = data.get("message")
+                        content_list = message.get("content") if message else None
+                        for content_item in content_list or ():
+                            # bound once, every branch below reads several keys
+                            get = content_item.get
+                            item_type = get("type")
+                            if item_type == "tool_use":
+                                tool_name = get("name", "UnknownTool")
+                                tool_input = get("input") or {}
+                                input_str = ", ".join(
+                                    [f"{k}='{v}'" for k, v in tool_input.items()]
                                 )
                                 logger.info(
-                                    f"[ASSISTANT] Response: {display_text}",
+                                    "[ASSISTANT] Tool Use: %s(%s)",
+                                    tool_name,
+                                    _truncate(input_str),
                                     extra=log_running,
                                 )
-                        elif item_type == "thinking":
-                            logger.info("[ASSISTANT] Thinking...", extra=log_running)
-
-                elif msg_type == "result":
-                    result_str = json.dumps(data)
-                    display_text = (
-                        (result_str[:250] + "...")
-                        if len(result_str) > 250
-                        else result_str
-                    )
-                    logger.info(
-                        f"[FINAL MESSAGE] Received: {display_text}", extra=log_running
-                    )
-                    return data
+                            elif item_type == "text":
+                                text = get("text", "").strip()
+                                if text:
+                                    logger.info(
+                                        "[ASSISTANT] Response: %s",
+                                        _truncate(text),
+                                        extra=log_running,
+                                    )
+                            elif item_type == "thinking":
+                                logger.info(
+                                    "[ASSISTANT] Thinking...", extra=log_running
+                                )
 
-                elif msg_type != "user":
-                    logger.debug(
-                        f"[OTHER] Unhandled message type: {line}", extra=log_running
-                    )
+                    case "result":
+                        # the raw line is already JSON, no need to serialize data again
+                        if log_info:
+                            logger.info(
+                                "[FINAL MESSAGE] Received: %s",
+                                _truncate(raw.decode("utf-8", "replace")),
+                                extra=log_running,
+                            )
+                        return data
+
+                    case _ if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            "[OTHER] Unhandled message type: %s",
+                            raw.decode("utf-8", "replace"),
+                            extra=log_running,
+                        )
 
-            except json.JSONDecodeError:
+            except JSONDecodeError:
                 logger.warning(
-                    f"Received Incomplete JSON line from stdout: {buffer}",
+                    "Received Incomplete JSON line from stdout: %s",
+                    buffer.decode("utf-8", "replace"),
                     extra=log_error,
                 )
                 continue
             except Exception as e:
                 logger.error(
-                    f"Error processing stream line: {line}. Error: {e}",
+                    "Error processing stream line: %s. Error: %s",
+                    line.decode("utf-8", "replace"),
+                    e,
                     extra=log_error,
                 )
-                buffer = ""
+                buffer = b""
 
         if buffer:
             logger.warning(
-                f"Stream ended with incomplete JSON in buffer (length: {len(buffer)})",
+                "Stream ended with incomplete JSON in buffer (length: %d)",
+                len(buffer),
                 extra=log_error,
             )
 
@@ -183,108 +277,113 @@ class ClaudeCodeRunner:
 
     async def _stream_stderr_handler(
         self, stream: asyncio.StreamReader, run_session_id: str
-    ) -> str:
-        stderr_output = await stream.read()
-        decoded_stderr = stderr_output.decode("utf-8").strip()
-        if decoded_stderr:
-            for line in decoded_stderr.splitlines():
-                logger.error(
-                    f"[STDERR] {line}",
-                    extra={"run_session_id": run_session_id, "status": "running"},
-                )
-        return decoded_stderr
+    ) -> bytes:
+        # log lines as they arrive, only the raw tail is kept for the caller to inspect
+        stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        log_running = {"run_session_id": run_session_id, "status": "running"}
+        async for line in self._iter_lines(stream):
+            line = line.strip()
+            if not line:
+                continue
+            logger.error(
+                "[STDERR] %s", line.decode("utf-8", "replace"), extra=log_running
+            )
+            stderr_tail.append(line)
+        return b"\n".join(stderr_tail)
+
+    def _build_cmd_args(
+        self, prompt: str, model: CLAUDE_CODE_MODELS
+    ) -> tuple[str, ...]:
+        return (
+            "claude",
+            "-p",
+            prompt,
+            "--output-format",
+            "stream-json",
+            "--model",
+            model,
+            *self._cmd_suffix,
+        )
 
     async def _run_claude_instance(
         self,
-        prompt: str,
+        cmd_base: tuple[str, ...],
+        cmd_with_c: Optional[tuple[str, ...]],
         directory: str,
         run_session_id: str,
-        model: CLAUDE_CODE_MODELS = CLAUDE_CODE_MODELS.CLAUDE_SONNET_4,
-        continue_conversation: bool = False,
     ) -> str:
-        log_extra = {"run_session_id": run_session_id}
+        log_running = {"run_session_id": run_session_id, "status": "running"}
 
         async def _run_and_stream(
-            cmd_args: list[str],
-        ) -> tuple[int, str, Optional[dict]]:
-            logger.debug(
-                f"Executing command: {' '.join(cmd_args)}",
-                extra={**log_extra, "status": "running"},
-            )
+            cmd_args: tuple[str, ...],
+        ) -> tuple[int, bytes, Optional[dict]]:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Executing command: %s", " ".join(cmd_args), extra=log_running
+                )
             process = await asyncio.create_subprocess_exec(
                 *cmd_args,
                 cwd=directory,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                env=os.environ.copy(),
-            )
-            stdout_task = asyncio.create_task(
-                self._stream_stdout_handler(process.stdout, run_session_id)
-            )
-            stderr_task = asyncio.create_task(
-                self._stream_stderr_handler(process.stderr, run_session_id)
+                limit=STREAM_LIMIT,
             )
-
-            final_result_json, stderr_output = await asyncio.gather(
-                stdout_task, stderr_task
-            )
-            await process.wait()
-            return process.returncode, stderr_output, final_result_json
-
-        cmd_base = [
-            "claude",
-            "-p",
-            prompt,
-            "--output-format",
-            "stream-json",
-            "--model",
-            model,
-            "--verbose",
-            "--allowedTools",
-            ",".join(self._get_allowed_tools()),
-        ]
-
-        if self._permissions == FilePermissions.FULL_ACCESS:
-            cmd_base.append("--dangerously-skip-permissions")
-
-        if continue_conversation:
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    stdout_task = tg.create_task(
+                        self._stream_stdout_handler(
+                            self._iter_lines(process.stdout), run_session_id
+                        )
+                    )
+                    stderr_task = tg.create_task(
+                        self._stream_stderr_handler(process.stderr, run_session_id)
+                    )
+                    wait_task = tg.create_task(process.wait())
+            except ExceptionGroup as eg:
+                # the retry loop matches on plain exceptions, surface the first
+                # failure the way gather did instead of the group wrapping it
+                raise eg.exceptions[0] from None
+            return wait_task.result(), stderr_task.result(), stdout_task.result()
+
+        if cmd_with_c is not None:
             logger.info(
                 "Attempting to continue conversation with '-c' flag.",
-                extra={**log_extra, "status": "running"},
+                extra=log_running,
             )
-            cmd_with_c = ["claude", "-c"] + cmd_base[1:]
             return_code, stderr, result_obj = await _run_and_stream(cmd_with_c)
 
-            if return_code != 0 and "No prior conversation history found" in stderr:
+            if return_code != 0 and NO_HISTORY_MARKER in stderr:
                 logger.warning(
                     "Continuation failed as no history was found. Retrying immediately without '-c'.",
-                    extra={**log_extra, "status": "running"},
+                    extra=log_running,
                 )
                 return_code, stderr, result_obj = await _run_and_stream(cmd_base)
         else:
             return_code, stderr, result_obj = await _run_and_stream(cmd_base)
 
         logger.info(
-            f"Process finished with exit code {return_code}",
-            extra={**log_extra, "status": "running"},
+            "Process finished with exit code %s", return_code, extra=log_running
         )
 
         if return_code != 0:
             raise ClaudeProcessError(
-                f"CLI tool failed with exit code {return_code}. Stderr: {stderr}"
+                f"CLI tool failed with exit code {return_code}. Stderr: {stderr.decode('utf-8', 'replace')}"
             )
         if not result_obj:
             raise ClaudeProcessError(
                 "CLI tool finished but produced no final result object."
             )
 
+        return self._check_result(result_obj, run_session_id)
+
+    def _check_result(self, result_obj: dict, run_session_id: str) -> str:
         is_error = result_obj.get("is_error", True)
         subtype = result_obj.get("subtype")
         if is_error or subtype != "success":
             error_message = f"Claude returned a non-successful result. Subtype: '{subtype}', Is Error: {is_error}."
             logger.error(
                 error_message,
-                extra={**log_extra, "status": "failed"},
+                extra={"run_session_id": run_session_id, "status": "failed"},
             )
             raise ClaudeProcessError(error_message, result_data=result_obj)
 
@@ -297,11 +396,25 @@ class ClaudeCodeRunner:
         model: CLAUDE_CODE_MODELS = CLAUDE_CODE_MODELS.CLAUDE_SONNET_4,
         continue_conversation: bool = False,
     ) -> str:
-        last_exception = None
-        self._runner_instance += 1
-        run_session_id = (
-            f"claude-{type(self)._claude_instance}-runner-{self._runner_instance}"
+        run_session_id = self._new_run_session_id()
+        # argv is the same for every attempt, build it once up front
+        cmd_base = self._build_cmd_args(prompt, model)
+        cmd_with_c = ("claude", "-c", *cmd_base[1:]) if continue_conversation else None
+        return await self._run_with_retries(
+            run_session_id,
+            lambda: self._run_claude_instance(
+                cmd_base, cmd_with_c, directory, run_session_id
+            ),
         )
+
+    def _new_run_session_id(self) -> str:
+        self._runner_instance += 1
+        return f"claude-{type(self)._claude_instance}-runner-{self._runner_instance}"
+
+    async def _run_with_retries(
+        self, run_session_id: str, run_once: Callable[[], Awaitable[str]]
+    ) -> str:
+        last_exception = None
         logger.info(
             "Starting Claude execution.",
             extra={"run_session_id": run_session_id, "status": "starting"},
@@ -310,16 +423,19 @@ class ClaudeCodeRunner:
             log_extra = {"run_session_id": run_session_id, "attempt": attempt + 1}
             try:
                 if attempt > 0:
-                    wait_time = 2**attempt
+                    # capped backoff, jitter stops concurrent runs retrying in lockstep
+                    wait_time = min(MAX_BACKOFF_SECONDS, 1 << attempt) + random.random()
                     logger.info(
-                        f"Retrying in {wait_time} seconds... (Attempt {attempt + 1}/{self._retries + 1})",
+                        "Retrying in %.1f seconds... (Attempt %d/%d)",
+                        wait_time,
+                        attempt + 1,
+                        self._retries + 1,
                         extra={**log_extra, "status": "retrying"},
                     )
                     await asyncio.sleep(wait_time)
 
-                result = await self._run_claude_instance(
-                    prompt, directory, run_session_id, model, continue_conversation
-                )
+                async with self._sem:
+                    result = await run_once()
                 logger.info(
                     "Claude execution successful.",
                     extra={**log_extra, "status": "success"},
@@ -328,13 +444,295 @@ class ClaudeCodeRunner:
             except (ClaudeProcessError, OSError) as e:
                 last_exception = e
                 logger.error(
-                    f"Execution failed on attempt {attempt + 1}. Error: {e}",
+                    "Execution failed on attempt %d. Error: %s",
+                    attempt + 1,
+                    e,
                     extra={**log_extra, "status": "failed"},
                 )
         logger.critical(
-            f"All {self._retries + 1} attempts failed. Aborting.",
+            "All %d attempts failed. Aborting.",
+            self._retries + 1,
             extra={"run_session_id": run_session_id, "status": "failed"},
         )
         raise ClaudeProcessError(
             f"All {self._retries + 1} attempts to run Claude failed."
         ) from last_exception
+
+
+class _PoolWorker:
+    __slots__ = ("process", "stderr_task", "lines", "turns")
+
+    def __init__(self, process: asyncio.subprocess.Process, stderr_task: asyncio.Task):
+        self.process = process
+        self.stderr_task = stderr_task
+        # one line iterator for the worker's whole life, bytes read past one
+        # prompt's result belong to the next prompt
+        self.lines = ClaudeCodeRunner._iter_lines(process.stdout)
+        self.turns = 0
+
+
+class _PoolEntry:
+    __slots__ = ("slots", "spares", "spawning", "recent")
+
+    def __init__(self, pool_size: int):
+        # bounds the workers busy with a prompt at once
+        self.slots = asyncio.Semaphore(pool_size)
+        # warm workers that have not had a prompt yet
+        self.spares: list[_PoolWorker] = []
+        self.spawning = 0
+        # idle worker holding the latest finished conversation
+        self.recent: Optional[_PoolWorker] = None
+
+
+# Keeps warm claude processes per (directory, model) and feeds prompts over stdin
+# with --input-format stream-json, so CLI startup happens ahead of time instead of
+# on every prompt. Works like ClaudeCodeRunner, a new conversation goes to a worker
+# that has never seen a prompt and continue_conversation picks up the latest
+# finished conversation for the directory and model, the same thing -c does.
+# A conversation is dropped after max_turns prompts and its worker stopped.
+class ClaudeCodePool(ClaudeCodeRunner):
+    __slots__ = (
+        "_pool_size",
+        "_max_turns",
+        "_shutdown_timeout",
+        "_workers",
+        "_live",
+        "_background",
+        "_closed",
+    )
+
+    def __init__(
+        self,
+        permissions: FilePermissions = FilePermissions.READ_ONLY,
+        retries: int = 5,
+        run_limit: Optional[int] = None,
+        pool_size: int = 4,
+        max_turns: int = 20,
+        shutdown_timeout: float = 10.0,
+    ):
+        super().__init__(permissions, retries, run_limit)
+        self._pool_size = max(1, pool_size)
+        self._max_turns = max(1, max_turns)
+        # how long a worker gets to exit after stdin is closed before it is killed
+        self._shutdown_timeout = shutdown_timeout
+        self._workers: dict[tuple[str, str], _PoolEntry] = {}
+        # every running worker, busy or idle, so close() can reach all of them
+        self._live: set[_PoolWorker] = set()
+        # spare spawns and retired worker shutdowns, awaited by close()
+        self._background: set[asyncio.Task] = set()
+        self._closed = False
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("ClaudeCodePool is closed")
+
+    def _in_background(self, coro: Coroutine[None, None, None]) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _spawn_worker(
+        self, directory: str, model: CLAUDE_CODE_MODELS, run_session_id: str
+    ) -> _PoolWorker:
+        cmd_args = (
+            "claude",
+            "-p",
+            "--input-format",
+            "stream-json",
+            "--output-format",
+            "stream-json",
+            "--model",
+            model,
+            *self._cmd_suffix,
+        )
+        logger.info(
+            "Starting pooled claude worker in directory: %s",
+            directory,
+            extra={"run_session_id": run_session_id, "status": "starting"},
+        )
+        process = await asyncio.create_subprocess_exec(
+            *cmd_args,
+            cwd=directory,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LIMIT,
+        )
+        # stderr is drained for the whole life of the worker, not per prompt
+        stderr_task = asyncio.create_task(
+            self._stream_stderr_handler(process.stderr, f"{run_session_id}-worker")
+        )
+        worker = _PoolWorker(process, stderr_task)
+        self._live.add(worker)
+        if self._closed:
+            # close() ran while this one was starting and could not see it
+            await self._discard_worker(worker)
+            self._check_open()
+        return worker
+
+    async def _spawn_spare(
+        self,
+        entry: _PoolEntry,
+        directory: str,
+        model: CLAUDE_CODE_MODELS,
+        run_session_id: str,
+    ) -> None:
+        try:
+            entry.spares.append(
+                await self._spawn_worker(directory, model, run_session_id)
+            )
+        except (OSError, RuntimeError) as e:
+            if not self._closed:
+                logger.warning(
+                    "Failed to start spare claude worker: %s",
+                    e,
+                    extra={"run_session_id": run_session_id, "status": "running"},
+                )
+        finally:
+            entry.spawning -= 1
+
+    def _replenish(
+        self,
+        entry: _PoolEntry,
+        directory: str,
+        model: CLAUDE_CODE_MODELS,
+        run_session_id: str,
+    ) -> None:
+        # warm the next fresh worker while this prompt runs, up to pool_size spares
+        if self._closed or len(entry.spares) + entry.spawning >= self._pool_size:
+            return
+        entry.spawning += 1
+        self._in_background(self._spawn_spare(entry, directory, model, run_session_id))
+
+    async def _discard_worker(self, worker: _PoolWorker) -> None:
+        self._live.discard(worker)
+        if worker.process.returncode is None:
+            worker.process.kill()
+        await worker.process.wait()
+        await worker.stderr_task
+
+    async def _stop_worker(self, worker: _PoolWorker) -> None:
+        # stdin EOF ends the CLI once its current turn is done, kill it if it hangs
+        self._live.discard(worker)
+        process = worker.process
+        if process.returncode is None:
+            process.stdin.close()
+            try:
+                await asyncio.wait_for(process.wait(), self._shutdown_timeout)
+            except TimeoutError:
+                process.kill()
+                await process.wait()
+        await worker.stderr_task
+
+    def _take_worker(
+        self, entry: _PoolEntry, continue_conversation: bool, log_running: dict
+    ) -> Optional[_PoolWorker]:
+        if continue_conversation:
+            worker, entry.recent = entry.recent, None
+            if worker is not None and worker.process.returncode is None:
+                return worker
+            logger.warning(
+                "No idle conversation to continue. Starting a new one.",
+                extra=log_running,
+            )
+            if worker is not None:
+                self._in_background(self._discard_worker(worker))
+        while entry.spares:
+            worker = entry.spares.pop()
+            if worker.process.returncode is None:
+                return worker
+            self._in_background(self._discard_worker(worker))
+        return None
+
+    async def _run_pooled(
+        self,
+        prompt: str,
+        directory: str,
+        model: CLAUDE_CODE_MODELS,
+        continue_conversation: bool,
+        run_session_id: str,
+    ) -> str:
+        self._check_open()
+        log_running = {"run_session_id": run_session_id, "status": "running"}
+        key = (directory, model)
+        entry = self._workers.get(key)
+        if entry is None:
+            entry = self._workers[key] = _PoolEntry(self._pool_size)
+
+        async with entry.slots:
+            self._check_open()
+            worker = self._take_worker(entry, continue_conversation, log_running)
+            try:
+                if worker is None or worker.turns == 0:
+                    self._replenish(entry, directory, model, run_session_id)
+                if worker is None:
+                    worker = await self._spawn_worker(directory, model, run_session_id)
+                message = {
+                    "type": "user",
+                    "message": {"role": "user", "content": prompt},
+                }
+                worker.process.stdin.write(_json_dumps(message) + b"\n")
+                await worker.process.stdin.drain()
+                result_obj = await self._stream_stdout_handler(
+                    worker.lines, run_session_id
+                )
+            except BaseException:
+                if worker is not None:
+                    await self._discard_worker(worker)
+                raise
+
+            if not result_obj:
+                await self._discard_worker(worker)
+                raise ClaudeProcessError(
+                    f"Pooled CLI process exited with code {worker.process.returncode} without a final result object."
+                )
+            worker.turns += 1
+
+            # once closed the worker is already being stopped by close()
+            if not self._closed:
+                if worker.turns >= self._max_turns:
+                    logger.info(
+                        "Conversation reached %d turns, recycling its worker.",
+                        worker.turns,
+                        extra=log_running,
+                    )
+                    self._in_background(self._stop_worker(worker))
+                else:
+                    # only the latest conversation can be continued, like -c
+                    previous, entry.recent = entry.recent, worker
+                    if previous is not None:
+                        self._in_background(self._stop_worker(previous))
+
+        return self._check_result(result_obj, run_session_id)
+
+    async def run_claude_code(
+        self,
+        prompt: str,
+        directory: str,
+        model: CLAUDE_CODE_MODELS = CLAUDE_CODE_MODELS.CLAUDE_SONNET_4,
+        continue_conversation: bool = False,
+    ) -> str:
+        self._check_open()
+        run_session_id = self._new_run_session_id()
+        return await self._run_with_retries(
+            run_session_id,
+            lambda: self._run_pooled(
+                prompt, directory, model, continue_conversation, run_session_id
+            ),
+        )
+
+    # stops every worker, busy ones get shutdown_timeout to finish their current
+    # prompt before they are killed, and new runs are refused from here on
+    async def close(self) -> None:
+        self._closed = True
+        self._workers.clear()
+        # spares still starting register themselves in _live before this returns
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await asyncio.gather(*(self._stop_worker(w) for w in list(self._live)))
+
+    async def __aenter__(self) -> "ClaudeCodePool":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
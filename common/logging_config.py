@@ -1,12 +1,31 @@
 import datetime as dt
 import json
-import copy
 from typing import override
 import logging
 import logging.config
+import logging.handlers
 import atexit
+import threading
+import time
 from pathlib import Path
 
+try:
+    import orjson
+
+    def _dumps(message: dict) -> str:
+        # datetimes serialize natively, same isoformat output as before
+        return orjson.dumps(
+            message, default=str, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+except ImportError:
+
+    def _dumps(message: dict) -> str:
+        return json.dumps(
+            message,
+            default=lambda v: v.isoformat() if isinstance(v, dt.datetime) else str(v),
+        )
+
+
 LOG_RECORD_BUILTIN_ATTRS = {
     "args",
     "asctime",
@@ -43,20 +62,20 @@ class JSONLogFormatter(logging.Formatter):
     ):
         super().__init__()
         self.fmt_keys = fmt_keys if fmt_keys is not None else {}
+        # iterated for every record, so keep a ready made tuple of the pairs
+        self._fmt_pairs = tuple(self.fmt_keys.items())
 
     # formats keys and returns json string
     @override
     def format(self, record: logging.LogRecord) -> str:
         message = self._prepare_log_dict(record)
-        return json.dumps(message, default=str)
+        return _dumps(message)
 
     # prepare json string
     def _prepare_log_dict(self, record: logging.LogRecord):
         always_fields = {
             "message": record.getMessage(),
-            "timestamp": dt.datetime.fromtimestamp(
-                record.created, tz=dt.timezone.utc
-            ).isoformat(),
+            "timestamp": dt.datetime.fromtimestamp(record.created, tz=dt.timezone.utc),
         }
 
         # excpetion handling
@@ -66,12 +85,12 @@ class JSONLogFormatter(logging.Formatter):
         if record.stack_info is not None:
             always_fields["stack_info"] = self.formatStack(record.stack_info)
 
-        message = {
-            key: msg_val
-            if (msg_val := always_fields.pop(val, None)) is not None
-            else getattr(record, val)
-            for key, val in self.fmt_keys.items()
-        }
+        message = {}
+        for key, val in self._fmt_pairs:
+            if val in always_fields:
+                message[key] = always_fields.pop(val)
+            else:
+                message[key] = getattr(record, val)
         message.update(always_fields)
 
         # any extra info passed in -> use extra = {K,V}
@@ -91,6 +110,14 @@ class SimpleLogFormatter(logging.Formatter):
     CYAN = "\x1b[36m"
     RESET = "\x1b[0m"
 
+    LEVEL_COLORS = {
+        logging.DEBUG: GREY,
+        logging.INFO: GREEN,
+        logging.WARNING: YELLOW,
+        logging.ERROR: RED,
+        logging.CRITICAL: BOLD_RED,
+    }
+
     def __init__(self):
         super().__init__()
         self.extra_keys_to_display = [
@@ -99,36 +126,159 @@ class SimpleLogFormatter(logging.Formatter):
             "status",
             "attempt",
         ]
+        # Format -> key=value, the coloured "key=" part never changes
+        self._extra_prefixes = tuple(
+            (key, f"{self.CYAN}{key}{self.RESET}=")
+            for key in self.extra_keys_to_display
+        )
 
     @override
     def format(self, record):
-        level_color = {
-            logging.DEBUG: self.GREY,
-            logging.INFO: self.GREEN,
-            logging.WARNING: self.YELLOW,
-            logging.ERROR: self.RED,
-            logging.CRITICAL: self.BOLD_RED,
-        }.get(record.levelno, self.GREY)
-        timestamp = dt.datetime.fromtimestamp(record.created).strftime(
-            "%Y-%m-%d %H:%M:%S"
-        )
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        parts = [
+            "[",
+            self.LEVEL_COLORS.get(record.levelno, self.GREY),
+            f"{record.levelname:^7}",
+            self.RESET,
+            "|",
+            record.name,
+            "] ",
+            self.GREY,
+            timestamp,
+            self.RESET,
+            ": ",
+            record.getMessage(),
+        ]
+
+        record_dict = record.__dict__
+        extra_parts = [
+            prefix + str(record_dict[key])
+            for key, prefix in self._extra_prefixes
+            if key in record_dict
+        ]
+        if extra_parts:
+            parts += (" ", self.GREY, "[", " ".join(extra_parts), "]", self.RESET)
+
+        # records reach the listener unprepared, so tracebacks are added here the
+        # same way logging.Formatter.format does, exc_text caches it for other handlers
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            parts += ("\n", record.exc_text)
+        if record.stack_info:
+            parts += ("\n", self.formatStack(record.stack_info))
+
+        return "".join(parts)
 
-        log_str = (
-            f"[{level_color}{record.levelname:^7}{self.RESET}|{record.name}] "
-            f"{self.GREY}{timestamp}{self.RESET}: {record.getMessage()}"
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # writes through a large buffer instead of flushing after every record
+    def __init__(
+        self,
+        *args,
+        buffer_size: int = 65536,
+        flush_every: int = 200,
+        flush_interval: float = 1.0,
+        **kwargs,
+    ):
+        self.buffer_size = buffer_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._size = 0
+        self._unflushed = 0
+        self._stop_flusher = threading.Event()
+        super().__init__(*args, **kwargs)
+        # emit only runs when a record arrives, so a quiet period would otherwise
+        # leave the last records sitting in the buffer
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="BufferedRotatingFileHandler-flush",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    @override
+    def _open(self):
+        stream = open(
+            self.baseFilename,
+            self.mode,
+            buffering=self.buffer_size,
+            encoding=self.encoding,
+            errors=self.errors,
         )
-        extra_parts = []
-        for key in self.extra_keys_to_display:
-            if hasattr(record, key):
-                # Format -> key=value
-                extra_parts.append(
-                    f"{self.CYAN}{key}{self.RESET}={getattr(record, key)}"
-                )
+        # track the file size ourselves so rollover checks never need tell()
+        self._size = stream.tell()
+        return stream
 
-        if extra_parts:
-            log_str += f" {self.GREY}[{' '.join(extra_parts)}]{self.RESET}"
+    # same as the base emit, but formats once and only flushes every flush_every
+    # records or straight away on errors, the flusher thread covers the rest
+    @override
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # orjson keeps non-ASCII text as is, so maxBytes has to count encoded bytes
+            size = (
+                len(msg)
+                if msg.isascii()
+                else len(msg.encode(self.stream.encoding, self.stream.errors))
+            )
+            if self.maxBytes > 0 and self._size and self._size + size >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._size += size
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every or record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
-        return log_str
+    def _flush_periodically(self):
+        while not self._stop_flusher.wait(self.flush_interval):
+            if not self._unflushed:
+                continue
+            # shutdown and reconfiguration close the handler while holding its lock,
+            # so never block on it, otherwise close() would wait on this thread forever
+            if not self.lock.acquire(timeout=0.1):
+                continue
+            try:
+                if not self._stop_flusher.is_set():
+                    self.flush()
+            finally:
+                self.lock.release()
+
+    @override
+    def flush(self):
+        # also called from the flusher thread, the lock is reentrant for emit
+        with self.lock:
+            super().flush()
+            self._unflushed = 0
+
+    @override
+    def close(self):
+        self._stop_flusher.set()
+        if (
+            self._flusher is not None
+            and self._flusher is not threading.current_thread()
+        ):
+            self._flusher.join()
+        super().close()
+
+
+class FastQueueHandler(logging.handlers.QueueHandler):
+    # records only go to the in-process listener thread, so they are handed over as is
+    # and formatted there instead of being pre-formatted and copied by the caller.
+    # Safe as long as log call args are not mutated after the call.
+    @override
+    def prepare(self, record):
+        return record
 
 
 LOGGING_CONFIG = {
@@ -160,7 +310,7 @@ LOGGING_CONFIG = {
             "stream": "ext://sys.stdout",
         },
         "file_json": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "()": BufferedRotatingFileHandler,
             "level": "DEBUG",
             "formatter": "json",
             "filename": Path("logs") / "my_app.log.jsonl",
@@ -168,7 +318,8 @@ LOGGING_CONFIG = {
             "backupCount": 5,
         },
         "queue_handler": {
-            "class": "logging.handlers.QueueHandler",
+            "class": FastQueueHandler,
+            "queue": "queue.SimpleQueue",
             "handlers": ["stderr", "file_json"],
             "respect_handler_level": True,
         },
@@ -182,8 +333,10 @@ LOGGING_CONFIG = {
 def config_logging(file_name: str):
     log_path = Path("logs") / file_name
     log_path.parent.mkdir(parents=True, exist_ok=True)
-    d_config = copy.deepcopy(LOGGING_CONFIG)
-    d_config["handlers"]["file_json"]["filename"] = str(log_path)
+    # only the file handler changes, everything else can be shared with the template
+    handlers = dict(LOGGING_CONFIG["handlers"])
+    handlers["file_json"] = {**handlers["file_json"], "filename": str(log_path)}
+    d_config = {**LOGGING_CONFIG, "handlers": handlers}
     # Configure logging and start listner thread
     logging.config.dictConfig(d_config)  # root logger
     queue_handler = logging.getHandlerByName("queue_handler")
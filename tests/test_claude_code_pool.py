@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from cli_runner import claude_code
+from cli_runner.claude_code import ClaudeCodePool, ClaudeProcessError
+
+FAKE_CLAUDE_DIR = Path(__file__).parent / "fake_claude"
+RESULT_RE = re.compile(r"pid=(\d+) turn=(\d+) ")
+
+
+def setUpModule():
+    # the pool runs "claude" from PATH, put the stub in front of any real install
+    patcher = mock.patch.dict(
+        os.environ, {"PATH": f"{FAKE_CLAUDE_DIR}{os.pathsep}{os.environ['PATH']}"}
+    )
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+    logging.getLogger("cli_runner").setLevel(logging.CRITICAL + 1)
+    # IsolatedAsyncioTestCase runs the loop in debug mode, which logs every transport
+    logging.getLogger("asyncio").setLevel(logging.WARNING)
+
+
+def parse(result: str) -> tuple[int, int]:
+    pid, turn = RESULT_RE.match(result).groups()
+    return int(pid), int(turn)
+
+
+class ClaudeCodePoolTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = ClaudeCodePool(retries=0, shutdown_timeout=2.0)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+
+    def entry(self) -> claude_code._PoolEntry:
+        return self.pool._workers[
+            (self.directory, claude_code.CLAUDE_CODE_MODELS.CLAUDE_SONNET_4)
+        ]
+
+    async def settle(self):
+        while self.pool._background:
+            await asyncio.gather(*self.pool._background)
+
+    async def run_prompt(self, prompt: str, **kwargs) -> tuple[int, int]:
+        return parse(await self.pool.run_claude_code(prompt, self.directory, **kwargs))
+
+    async def test_new_prompt_goes_to_spare_worker(self):
+        first_pid, turn = await self.run_prompt("a")
+        self.assertEqual(turn, 1)
+        await self.settle()
+        spare_pid = self.entry().spares[-1].process.pid
+        self.assertNotEqual(spare_pid, first_pid)
+
+        pid, turn = await self.run_prompt("b")
+        self.assertEqual((pid, turn), (spare_pid, 1))
+
+    async def test_concurrent_new_prompts_get_separate_conversations(self):
+        results = await asyncio.gather(*(self.run_prompt(f"q{i}") for i in range(5)))
+        self.assertEqual({turn for _, turn in results}, {1})
+        self.assertEqual(len({pid for pid, _ in results}), 5)
+
+    async def test_continue_conversation_takes_recent_worker(self):
+        pid, _ = await self.run_prompt("a")
+        self.assertEqual(
+            await self.run_prompt("b", continue_conversation=True), (pid, 2)
+        )
+        self.assertEqual(
+            await self.run_prompt("c", continue_conversation=True), (pid, 3)
+        )
+
+    async def test_continue_conversation_falls_back_when_nothing_idle(self):
+        _, turn = await self.run_prompt("a", continue_conversation=True)
+        self.assertEqual(turn, 1)
+
+        # the recent worker is busy with the first continuation
+        recent_pid, _ = await self.run_prompt("b")
+        busy = asyncio.create_task(
+            self.run_prompt("slow:0.5", continue_conversation=True)
+        )
+        await asyncio.sleep(0.1)
+        pid, turn = await self.run_prompt("c", continue_conversation=True)
+        self.assertNotEqual(pid, recent_pid)
+        self.assertEqual(turn, 1)
+        self.assertEqual(await busy, (recent_pid, 2))
+
+    async def test_worker_recycled_after_max_turns(self):
+        self.pool._max_turns = 2
+        pid, _ = await self.run_prompt("a")
+        await self.run_prompt("b", continue_conversation=True)
+        self.assertIsNone(self.entry().recent)
+        await self.settle()
+        self.assertNotIn(pid, {w.process.pid for w in self.pool._live})
+
+        new_pid, turn = await self.run_prompt("c", continue_conversation=True)
+        self.assertNotEqual(new_pid, pid)
+        self.assertEqual(turn, 1)
+
+    async def test_dead_worker_discarded_and_retried(self):
+        pool = ClaudeCodePool(retries=1, shutdown_timeout=2.0)
+        self.addAsyncCleanup(pool.close)
+        marker = Path(self.directory) / "died"
+        with (
+            mock.patch.dict(os.environ, {"FAKE_CLAUDE_DIE_ONCE": str(marker)}),
+            mock.patch.object(claude_code, "MAX_BACKOFF_SECONDS", 0),
+        ):
+            result = await pool.run_claude_code("die", self.directory)
+        self.assertTrue(marker.exists())
+        pid, turn = parse(result)
+        self.assertEqual(turn, 1)
+        self.assertTrue(
+            all(w.process.returncode is None for w in pool._live),
+            "the dead worker should have been discarded",
+        )
+        self.assertIn(pid, {w.process.pid for w in pool._live})
+
+    async def test_dead_worker_raises_without_retries(self):
+        with self.assertRaises(ClaudeProcessError):
+            await self.run_prompt("die")
+        self.assertTrue(all(w.process.returncode is None for w in self.pool._live))
+
+    async def test_close_reaches_busy_workers(self):
+        busy = asyncio.create_task(self.run_prompt("slow:0.5"))
+        await asyncio.sleep(0.2)
+        processes = [w.process for w in self.pool._live]
+        await self.pool.close()
+
+        self.assertFalse(self.pool._live)
+        self.assertTrue(all(p.returncode is not None for p in processes))
+        # the busy worker finished its prompt inside shutdown_timeout
+        self.assertEqual((await busy)[1], 1)
+        with self.assertRaises(RuntimeError):
+            await self.run_prompt("after close")
+
+    async def test_close_kills_worker_ignoring_stdin_eof(self):
+        with mock.patch.dict(os.environ, {"FAKE_CLAUDE_IGNORE_EOF": "1"}):
+            pool = ClaudeCodePool(retries=0, shutdown_timeout=0.5)
+            await pool.run_claude_code("a", self.directory)
+            processes = [w.process for w in pool._live]
+            started = time.monotonic()
+            await pool.close()
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertTrue(all(p.returncode is not None for p in processes))
+
+
+if __name__ == "__main__":
+    unittest.main()